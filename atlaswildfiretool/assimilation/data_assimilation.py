@@ -187,7 +187,7 @@ class DataAssimilation:
         )
 
         # Binarize the image: set values < 0.5 to 0, and values >= 0.5 to 1
-        binarized_image = np.where(normalized_image < 0.5, 0, 1)
+        binarized_image = (normalized_image >= 0.5).astype(np.uint8)
 
         # Plot the binarized image
         plt.imshow(binarized_image, cmap="gray")  # Use gray scale for binary images
@@ -200,5 +200,5 @@ class DataAssimilation:
         normalized_image = (self.fixed_image[0] - np.min(self.fixed_image[0])) / (
             np.max(self.fixed_image[0]) - np.min(self.fixed_image[0])
         )
-        self.binarized_image = np.where(normalized_image < 0.5, 0, 1)
+        self.binarized_image = (normalized_image >= 0.5).astype(np.uint8)
         np.save(save_path, self.binarized_image.reshape(256, 256))
@@ -33,7 +33,11 @@ def plot_batch_recon_images(
     Args:
         model (torch.nn.Module): The model to be used for image reconstruction.
         data_loader (torch.utils.data.DataLoader): DataLoader providing the
-                                                    batch of images.
+                                                    batch of images. On CUDA,
+                                                    build it with
+                                                    pin_memory=True so the
+                                                    transfer can overlap with
+                                                    compute.
         num_images (int, optional): Number of images to plot. Defaults to 5.
         cmap (str, optional): Colormap for displaying images.
                             Defaults to 'viridis'.
@@ -58,22 +62,27 @@ def plot_batch_recon_images(
     else:
         idxs = plot_idxs if plot_idxs is not None else [0, 1, 2]
 
-    for n, idx in enumerate(idxs):
-        img = img_batch[idx].float().unsqueeze(0).to(device)
-        recon, _ = model(img)
+    # Run one batched forward over the selected images instead of a model
+    # call (and a host-device round trip) per image
+    idxs = [int(idx) for idx in idxs]
+    with torch.inference_mode():
+        imgs = img_batch[idxs].float().to(device, non_blocking=True)
+        recons, _ = model(imgs)
 
-        img = img.detach().cpu().squeeze()
-        recon = recon.detach().cpu().squeeze()
+        # Compute the diffs while still on device, then move raw/recon/diff
+        # to host in a single stacked copy
+        arr = torch.stack([imgs, recons, imgs - recons]).cpu().numpy()
 
-        ax[0, n].imshow(img.numpy(), cmap=cmap)
+    for n, idx in enumerate(idxs):
+        ax[0, n].imshow(arr[0, n].squeeze(), cmap=cmap)
         ax[0, n].set_title(f"raw {idx} idx image", fontsize=fontsize)
         ax[0, n].axis("off")
 
-        ax[1, n].imshow(recon.numpy(), cmap=cmap)
+        ax[1, n].imshow(arr[1, n].squeeze(), cmap=cmap)
         ax[1, n].set_title(f"recon {idx} idx image", fontsize=fontsize)
         ax[1, n].axis("off")
 
-        ax[2, n].imshow((img - recon).numpy(), cmap=cmap)
+        ax[2, n].imshow(arr[2, n].squeeze(), cmap=cmap)
         ax[2, n].set_title("diff (raw - recon)", fontsize=fontsize)
         ax[2, n].axis("off")
 
@@ -124,7 +133,12 @@ def plot_single_raw_and_dataset_idx_image(
 
 
 def generate_images_from_latent_space_vectors(
-    model: nn.Module, num_samples: int = 100, latent_dim: int = 16, device: str = "cpu"
+    model: nn.Module,
+    num_samples: int = 100,
+    latent_dim: int = 16,
+    device: str = "cpu",
+    compile: bool = False,
+    dtype: Optional[torch.dtype] = None,
 ) -> torch.Tensor:
     """
     Generate images by decoding latent space vectors.
@@ -139,6 +153,13 @@ def generate_images_from_latent_space_vectors(
         Dimensionality of the latent space, by default 16.
     device : str, optional
         Device on which to perform computations, by default "cpu".
+    compile : bool, optional
+        Whether to torch.compile the decode method on CUDA, by default False.
+        The first call is slow while the graph compiles; repeated calls with
+        the same num_samples reuse the compiled graph.
+    dtype : torch.dtype, optional
+        Autocast dtype for the decode, by default torch.bfloat16 on CUDA and
+        torch.float32 on CPU. The returned samples are always float32.
 
     Returns
     -------
@@ -146,9 +167,24 @@ def generate_images_from_latent_space_vectors(
         The tensor containing generated images after decoding random latent space vectors.
     """
     model.eval()
-    with torch.no_grad():
-        z = torch.randn(num_samples, latent_dim).to(device)
-        samples = model.decode(z).cpu()
+    decode = model.decode
+    if compile and torch.cuda.is_available():
+        decode = torch.compile(decode, mode="reduce-overhead", fullgraph=False)
+
+    if dtype is None:
+        dtype = torch.bfloat16 if device == "cuda" else torch.float32
+    autocast_enabled = device == "cuda" and dtype != torch.float32
+
+    with torch.inference_mode(), torch.autocast(
+        device_type="cuda", dtype=dtype, enabled=autocast_enabled
+    ):
+        z = torch.randn(
+            num_samples,
+            latent_dim,
+            device=device,
+            dtype=next(model.parameters()).dtype,
+        )
+        samples = decode(z).float().cpu()
         return samples
 
 
@@ -190,15 +226,19 @@ def plot_generated_images_from_latent_space(
     )
     nrows, ncols = 10, 10  # TODO: make these dynamic based on num_samples if needed
 
+    # Reshape and threshold the whole stack in one vectorized pass; the loop
+    # below only draws. The >= comparison preserves the old np.where
+    # 'img < threshold -> 0' semantics
+    imgs = generated_images.view(num_samples, *img_dims).numpy()
+    if pixel_threshold is not None:
+        imgs = (imgs >= pixel_threshold).astype(np.uint8)
+
     fig, ax = plt.subplots(nrows=nrows, ncols=ncols, figsize=figsize)
     for i in range(nrows):
         for j in range(ncols):
             img_idx = i * ncols + j
             if img_idx < num_samples:
-                img = generated_images[img_idx].view(*img_dims).squeeze()
-                if pixel_threshold is not None:
-                    img = np.where(img < pixel_threshold, 0, 1)
-                ax[i, j].imshow(img, cmap="gray")
+                ax[i, j].imshow(imgs[img_idx], cmap="gray")
                 ax[i, j].axis("off")
     plt.tight_layout()
     plt.show()
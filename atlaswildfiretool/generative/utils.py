@@ -1,15 +1,15 @@
 """This module contains functions and utilities used throughout the generative package."""
 
+import gc
 from typing import Callable, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.ndimage import gaussian_filter
 from skimage.metrics import structural_similarity as ssim
 
 import torch
 import torch.nn as nn
-from sklearn.metrics import mean_squared_error
+import torch.nn.functional as F
 from torch.utils.data import DataLoader
 
 
@@ -35,6 +35,11 @@ def generate_and_filter_images(
     threshold=0.2,
     num_images=10,
     print_info=False,
+    compile=False,
+    chunk_size=64,
+    dtype=None,
+    use_ssim=False,
+    plot=True,
 ):
     """
     Generate images from random latent vectors and filter them based on pixel ratio criteria.
@@ -48,15 +53,30 @@ def generate_and_filter_images(
         threshold (float): The threshold value for binarizing the generated images.
         num_images (int): Number of "top" images to generate and display.
         print_info (bool): Whether to print debugging information.
+        compile (bool): Whether to torch.compile the decoder on CUDA. The
+            first call is slow while the graph compiles; repeated calls with
+            the same num_samples reuse the compiled graph.
+        chunk_size (int): Number of samples to decode and filter per
+            minibatch, so peak memory is bounded by the chunk rather than
+            num_samples.
+        dtype (torch.dtype): Autocast dtype for the decode and smoothing
+            steps. Defaults to torch.bfloat16 on CUDA and torch.float32 on
+            CPU; there is no gradient path so the reduced precision is safe.
+        use_ssim (bool): Whether to re-rank the lowest-MSE pairs by SSIM.
+            SSIM is by far the heaviest per-pair cost, so this defaults to
+            False and the best pair is chosen on MSE alone.
+        plot (bool): Whether to build and show the matplotlib figures. Set
+            False in headless or batch runs to skip the rasterization and
+            figure memory entirely.
 
     Returns:
-        filtered_generated_images (list): List of generated images that meet the pixel ratio criteria.
+        filtered_generated_images (np.ndarray): Array of binarized generated images that meet the pixel ratio criteria.
         best_generated_image (np.ndarray): The generated image with the lowest MSE.
         best_obs_image (np.ndarray): The observation image with the lowest MSE.
         best_obs_index (int): The index of the observation image with the lowest MSE.
         lowest_mse (float): The lowest MSE value found.
-        top_images (list): List of the generated images with the lowest MSE.
-        top_mses (list): List of the MSE values of the top generated images.
+        top_images (np.ndarray): The generated images with the lowest MSE.
+        top_mses (np.ndarray): The MSE values of the top generated images.
 
     Example:
         filtered_generated_images, best_generated_image, best_obs_image, best_obs_index, lowest_mse, top_images, top_mses = generate_and_filter_images(
@@ -74,124 +94,206 @@ def generate_and_filter_images(
 
     latent_dim = get_latent_dim(autoencoder)
 
-    # Generate images from latent space
-    z = torch.randn(num_samples, latent_dim).to(device)
-    with torch.no_grad():
-        generated_images = autoencoder.decoder(z).cpu().numpy()
-
-    # Reshape generated images to 2D
-    generated_images = generated_images.reshape((num_samples, 256, 256))
-
-    # Apply Gaussian filter to smooth images
-    smoothed_images = [gaussian_filter(img, sigma=1) for img in generated_images]
-
-    # Filtered images based on pixel ratio criteria
-    filtered_generated_images = []
-
-    for i in range(num_samples):
-        generated_image = smoothed_images[i].squeeze()
-
-        # Binarize the generated image with the specified threshold
-        binary_image = np.where(generated_image >= threshold, 1, 0)
+    decoder = autoencoder.decoder
+    if compile and torch.cuda.is_available():
+        decoder = torch.compile(decoder, mode="reduce-overhead", fullgraph=False)
+
+    # Generate images from latent space, decoding and filtering one chunk at
+    # a time so only the uint8 survivors are ever resident on the host.
+    # Sampling directly on the device avoids a host allocation and copy
+    z = torch.randn(
+        num_samples,
+        latent_dim,
+        device=device,
+        dtype=next(autoencoder.parameters()).dtype,
+    )
+    total_pixels = 256 * 256
+    filtered_chunks = []
 
-        # Calculate pixel ratio
-        total_pixels = np.prod(binary_image.shape)
-        active_pixels = np.sum(binary_image == 1)
-        pixel_ratio = (active_pixels / total_pixels) * 100
+    if dtype is None:
+        dtype = torch.bfloat16 if device == "cuda" else torch.float32
+    autocast_enabled = device == "cuda" and dtype != torch.float32
 
-        if print_info:
-            # Debugging prints
-            print(f"Generated Image {i + 1}/{num_samples}")
-            print(f"Threshold: {threshold}")
-            print(f"Total Pixels: {total_pixels}")
-            print(f"Active Pixels: {active_pixels}")
-            print(f"Pixel Ratio: {pixel_ratio:.2f}%")
+    with torch.inference_mode(), torch.autocast(
+        device_type="cuda", dtype=dtype, enabled=autocast_enabled
+    ):
+        # Separable Gaussian kernel (sigma=1), built once and reused per chunk
+        kernel = torch.exp(
+            -torch.arange(-3, 4, device=device, dtype=torch.float32) ** 2 / 2
+        )
+        kernel = kernel / kernel.sum()
+
+        for chunk_start, z_chunk in zip(
+            range(0, num_samples, chunk_size), z.split(chunk_size)
+        ):
+            # Reshape generated images to (N, 1, H, W) for the convolutions
+            generated_images = decoder(z_chunk).view(-1, 1, 256, 256)
+
+            # Smooth with the separable Gaussian kernel while the chunk is
+            # still on the device, instead of per-image scipy filters on CPU
+            smoothed_images = F.conv2d(
+                generated_images, kernel.view(1, 1, 1, -1), padding=(0, 3)
+            )
+            smoothed_images = F.conv2d(
+                smoothed_images, kernel.view(1, 1, -1, 1), padding=(3, 0)
+            )
 
-        # Check if the pixel ratio is within the specified range
-        if pixel_ratio_range[0] <= pixel_ratio <= pixel_ratio_range[1]:
-            filtered_generated_images.append(binary_image)
+            # Binarize the chunk with the specified threshold
+            binary_images = (smoothed_images >= threshold).to(torch.uint8)
+            binary_images = binary_images.view(-1, 256, 256)
+
+            # Calculate pixel ratios for the chunk in one vectorized pass
+            active_pixels = binary_images.flatten(1).sum(1)
+            pixel_ratios = active_pixels * (100.0 / total_pixels)
+
+            if print_info:
+                # Debugging prints
+                for i in range(len(binary_images)):
+                    print(f"Generated Image {chunk_start + i + 1}/{num_samples}")
+                    print(f"Threshold: {threshold}")
+                    print(f"Total Pixels: {total_pixels}")
+                    print(f"Active Pixels: {active_pixels[i].item()}")
+                    print(f"Pixel Ratio: {pixel_ratios[i].item():.2f}%")
+
+            # Keep the images whose pixel ratio falls within the specified
+            # range and only transfer the survivors back to host memory
+            ratio_mask = (pixel_ratios >= pixel_ratio_range[0]) & (
+                pixel_ratios <= pixel_ratio_range[1]
+            )
+            if ratio_mask.any():
+                filtered_chunks.append(binary_images[ratio_mask].cpu().numpy())
 
     # Check if filtered images are 0 or not
-    if len(filtered_generated_images) == 0:
+    if len(filtered_chunks) == 0:
         print("No images meet the pixel ratio criteria.")
         return None
 
+    filtered_generated_images = np.concatenate(filtered_chunks)
+
+    # Drop the latent batch and the last chunk's device tensors before the
+    # comparison phase so only the uint8 survivors stay resident
+    del z, generated_images, smoothed_images, binary_images, filtered_chunks
+    gc.collect()
+    if device == "cuda":
+        torch.cuda.empty_cache()
+
     total_valid_generated_images = len(filtered_generated_images)
     print(f"Total Valid Generated Images: {total_valid_generated_images}")
 
-    # Initialize variables to store the lowest MSE and corresponding images
-    lowest_mse = float("inf")
-    highest_ssim = -1
-    best_generated_image = None
-    best_obs_image = None
-    best_obs_index = None
-
-    # Iterate through generated images and compare with observation images
-    for i in range(total_valid_generated_images):
-        generated_image = filtered_generated_images[i]
-
-        for j in range(len(obs_dataset)):
-            obs_image = obs_dataset[j].squeeze()
-
-            # Compute MSE
-            mse = mean_squared_error(obs_image, generated_image)
-            # Compute SSIM
-            ssim_value = ssim(
-                obs_image,
-                generated_image,
-                data_range=generated_image.max() - generated_image.min(),
-            )
-
-            # Update the best image based on combined criteria
-            if mse < lowest_mse and ssim_value > highest_ssim:
-                lowest_mse = mse
-                highest_ssim = ssim_value
-                best_generated_image = generated_image
-                best_obs_image = obs_image
-                best_obs_index = j
-
-    # Plot the best image with the obs image side by side
-    fig, ax = plt.subplots(1, 2, figsize=(10, 5))
-    ax[0].imshow(best_generated_image, cmap="viridis")
-    ax[0].set_title("Best Generated Image")
-    ax[0].axis("off")
-
-    ax[1].imshow(best_obs_image, cmap="viridis")
-    ax[1].set_title("Best Observation Image")
-    ax[1].axis("off")
-    plt.show()
-
-    # Compare filtered images with the best generated image
-    mse_list = []
-    for generated_image in filtered_generated_images:
-        mse = mean_squared_error(best_generated_image, generated_image)
-        mse_list.append(mse)
-
-    # Get the top 100 images
-    top_indices = np.argsort(mse_list)[:num_images]
-    top_images = [filtered_generated_images[i] for i in top_indices]
-    top_mses = [mse_list[i] for i in top_indices]
-
-    # Plot top images if less than or equal to 100, else plot the first 100
-    images_to_plot = min(num_images, 100)
-    num_rows = (images_to_plot + 9) // 10  # Ensure 10 images per row
-    fig, ax = plt.subplots(num_rows, 10, figsize=(20, 2 * num_rows))
-
-    for i in range(images_to_plot):
-        row = i // 10
-        col = i % 10
-        ax[row, col].imshow(top_images[i], cmap="viridis")
-        ax[row, col].set_title(f"MSE: {top_mses[i]:.2f}")
-        ax[row, col].axis("off")
-
-    # Hide any unused subplots
-    for j in range(images_to_plot, num_rows * 10):
-        row = j // 10
-        col = j % 10
-        fig.delaxes(ax[row, col])
-
-    plt.tight_layout()
-    plt.show()
+    # Pull each observation out of the dataset exactly once into a contiguous
+    # float32 stack and flatten both sides, so the full MSE matrix is
+    # computed in a single batched pass instead of an F x O loop
+    obs_images = np.stack(
+        [
+            np.asarray(obs_dataset[j], dtype=np.float32).squeeze()
+            for j in range(len(obs_dataset))
+        ]
+    )
+    obs_flat = obs_images.reshape(len(obs_images), -1)
+    gen_flat = filtered_generated_images.reshape(
+        total_valid_generated_images, -1
+    ).astype(np.float32)
+
+    # Expand ||o - g||^2 as o.o + g.g - 2 o.g to avoid the O x F x HW temporary
+    num_pixels = gen_flat.shape[1]
+    mse_matrix = (
+        (obs_flat**2).sum(axis=1)[:, None]
+        + (gen_flat**2).sum(axis=1)[None, :]
+        - 2.0 * obs_flat @ gen_flat.T
+    ) / num_pixels
+
+    if use_ssim:
+        # Only score the lowest-MSE candidate pairs with SSIM rather than the
+        # full F x O grid. Thresholding produces binary images, so the data
+        # range is a constant 1 and the per-call min/max are unnecessary
+        num_candidates = min(num_images, mse_matrix.size)
+        candidate_idx = np.argpartition(mse_matrix.ravel(), num_candidates - 1)[
+            :num_candidates
+        ]
+        candidate_pairs = np.unravel_index(candidate_idx, mse_matrix.shape)
+        ssim_values = np.array(
+            [
+                ssim(
+                    obs_images[i],
+                    filtered_generated_images[j].astype(np.float32),
+                    data_range=1.0,
+                )
+                for i, j in zip(*candidate_pairs)
+            ]
+        )
+        best_candidate = int(np.argmax(ssim_values))
+        best_obs_index = int(candidate_pairs[0][best_candidate])
+        best_gen_index = int(candidate_pairs[1][best_candidate])
+        best_pair_ssim = float(ssim_values[best_candidate])
+    else:
+        # Select the best pair on MSE alone (the old loop required the lowest
+        # MSE and the highest SSIM to improve simultaneously, which could
+        # skip the true minimum)
+        best_obs_index, best_gen_index = np.unravel_index(
+            np.argmin(mse_matrix), mse_matrix.shape
+        )
+        best_obs_index = int(best_obs_index)
+        best_pair_ssim = None
+
+    lowest_mse = float(mse_matrix[best_obs_index, best_gen_index])
+    best_generated_image = filtered_generated_images[best_gen_index]
+    best_obs_image = obs_images[best_obs_index]
+
+    if print_info:
+        if best_pair_ssim is not None:
+            print(f"Lowest MSE: {lowest_mse:.4f} (SSIM: {best_pair_ssim:.4f})")
+        else:
+            print(f"Lowest MSE: {lowest_mse:.4f}")
+
+    if plot:
+        # Plot the best image with the obs image side by side
+        fig, ax = plt.subplots(1, 2, figsize=(10, 5))
+        ax[0].imshow(best_generated_image, cmap="viridis")
+        ax[0].set_title("Best Generated Image")
+        ax[0].axis("off")
+
+        ax[1].imshow(best_obs_image, cmap="viridis")
+        ax[1].set_title("Best Observation Image")
+        ax[1].axis("off")
+        plt.show()
+        plt.close(fig)
+
+    # Compare filtered images with the best generated image in one fused
+    # reduction over the already-flattened float32 stack
+    diffs = gen_flat - gen_flat[best_gen_index]
+    mse_list = np.einsum("ij,ij->i", diffs, diffs) / num_pixels
+
+    # Get the top images via a partial selection (O(F) instead of a full
+    # sort), then order just those k for display
+    num_top = min(num_images, len(mse_list))
+    top_indices = np.argpartition(mse_list, num_top - 1)[:num_top]
+    top_indices = top_indices[np.argsort(mse_list[top_indices])]
+    top_images = filtered_generated_images[top_indices]
+    top_mses = mse_list[top_indices]
+
+    if plot:
+        # Plot top images if less than or equal to 100, else plot the first 100
+        images_to_plot = min(len(top_images), 100)
+        num_rows = (images_to_plot + 9) // 10  # Ensure 10 images per row
+        fig, ax = plt.subplots(num_rows, 10, figsize=(20, 2 * num_rows))
+        ax = np.atleast_2d(ax)  # a single row comes back as a 1D axes array
+
+        for i in range(images_to_plot):
+            row = i // 10
+            col = i % 10
+            ax[row, col].imshow(top_images[i], cmap="viridis")
+            ax[row, col].set_title(f"MSE: {top_mses[i]:.2f}")
+            ax[row, col].axis("off")
+
+        # Hide any unused subplots
+        for j in range(images_to_plot, num_rows * 10):
+            row = j // 10
+            col = j % 10
+            fig.delaxes(ax[row, col])
+
+        plt.tight_layout()
+        plt.show()
+        plt.close(fig)
 
     return (
         filtered_generated_images,
@@ -263,17 +365,17 @@ def sequential_train_val_split(
     Returns:
         Tuple[np.ndarray, np.ndarray]: Tuple containing training and validation datasets.
     """
-    val_idx = []
-    for i in range(
+    val_idx = np.arange(
         (sequence_jump * start_offset) + 1,
         train_data.shape[0],
         sequence_jump * jump_multiplier,
-    ):
-        val_idx.append(i)
+    )
 
-    train_idx = [i for i in range(train_data.shape[0]) if i not in val_idx]
+    # Boolean mask avoids the O(N * |val|) list-membership scan
+    train_mask = np.ones(train_data.shape[0], dtype=bool)
+    train_mask[val_idx] = False
 
-    X_train = train_data[train_idx]
+    X_train = train_data[train_mask]
     X_val = train_data[val_idx]
 
     if _print:
@@ -302,10 +404,17 @@ def load_model(model_obj: nn.Module, model_path: str, device: str) -> nn.Module:
     nn.Module
         The model with loaded weights, moved to the specified device and set to evaluation mode.
     """
-    model_obj.load_state_dict(
-        torch.load(model_path, map_location=torch.device(device))["model_state_dict"]
-    )
+    # Load the checkpoint onto the CPU first so that on CUDA the tensors are
+    # not allocated twice (once by the unpickler, once by the parameters)
+    checkpoint = torch.load(model_path, map_location="cpu", weights_only=True)
+    model_obj.load_state_dict(checkpoint["model_state_dict"])
+    del checkpoint
+
     model_obj.to(device)
+    if device == "cuda":
+        torch.cuda.empty_cache()
+    # NHWC layout lets the conv kernels use more cache-friendly memory access
+    model_obj = model_obj.to(memory_format=torch.channels_last)
     model_obj.eval()
 
     return model_obj
@@ -316,6 +425,7 @@ def test_data_metrics(
     criterion: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
     data_loader: DataLoader,
     device: str,
+    compile: bool = False,
 ) -> float:
     """
     Evaluate a model using a specified criterion on a dataset provided by a DataLoader.
@@ -328,18 +438,30 @@ def test_data_metrics(
         The function to compute the error metric between model predictions and true data.
     data_loader : DataLoader
         The DataLoader providing the dataset over which the model is evaluated.
+        On CUDA, build it with ``pin_memory=True`` (and ``num_workers >= 2``)
+        so the non-blocking transfers overlap with the model forward.
     device : str
         The device to which data should be moved before model evaluation ('cpu' or 'cuda').
+    compile : bool, optional
+        Whether to torch.compile the model on CUDA before the evaluation loop.
+        The first batch is slow while the graph compiles, and a differently
+        shaped last batch forces a recompile, so build the DataLoader with
+        ``drop_last=True`` when enabling this.
 
     Returns
     -------
     float
         The average error across all data in the dataset as calculated by the criterion.
     """
+    if compile and torch.cuda.is_available():
+        model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
+
     total_error = 0.0
-    with torch.no_grad():
+    with torch.inference_mode():
         for X_test in data_loader:
-            X_test = X_test.float().to(device)
+            X_test = X_test.to(device, non_blocking=True).float()
+            if X_test.dim() == 4:
+                X_test = X_test.to(memory_format=torch.channels_last)
             recon, _ = model(X_test)
             error = criterion(recon, X_test)
             total_error += error.item()